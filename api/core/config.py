@@ -1,4 +1,5 @@
 import os
+from functools import cached_property
 from dotenv import load_dotenv
 
 # Loading environment variables from .env file
@@ -12,26 +13,40 @@ class Settings:
     # Qdrant Configuration
     QDRANT_HOST: str = os.getenv("QDRANT_HOST", "localhost")
     QDRANT_PORT: int = int(os.getenv("QDRANT_PORT", 6333))
+    QDRANT_GRPC_PORT: int = int(os.getenv("QDRANT_GRPC_PORT", 6334))
+    QDRANT_PREFER_GRPC: bool = os.getenv("QDRANT_PREFER_GRPC", "true").lower() == "true"
     QDRANT_COLLECTION_NAME: str = "image_embeddings"
     
     # Model Configuration
     EMBEDDING_MODEL: str = os.getenv("EMBEDDING_MODEL_NAME", "openai/clip-vit-large-patch14")
     EMBEDDING_SIZE: int = int(os.getenv("EMBEDDING_SIZE", 768))
+    CLIP_ONNX_DIR: str = os.getenv("CLIP_ONNX_DIR", "clip_onnx")  # Output of scripts/export_onnx.py
+    TEXT_EMBEDDING_CACHE_SIZE: int = int(os.getenv("TEXT_EMBEDDING_CACHE_SIZE", 4096))
+    TEXT_BATCH_WINDOW_MS: float = float(os.getenv("TEXT_BATCH_WINDOW_MS", 8))
+    TEXT_BATCH_MAX_SIZE: int = int(os.getenv("TEXT_BATCH_MAX_SIZE", 32))
     
     # Paths - Handle Docker vs local development
     IMAGE_DIR: str = os.getenv("IMAGE_DIR", "data/images")
     DOCKER_IMAGE_DIR: str = "/app/images"  # Path inside Docker container
+    IMAGE_LIST_TTL: int = int(os.getenv("IMAGE_LIST_TTL", 300))  # Seconds before re-listing IMAGE_DIR
+    THUMB_DIR: str = os.getenv("THUMB_DIR", "cache/thumbs")  # Pre-resized JPEGs sent to the LLM
     
     # API Configuration
     API_HOST: str = os.getenv("API_HOST", "0.0.0.0")
     API_PORT: int = int(os.getenv("API_PORT", 8000))
+    API_WORKERS: int = int(os.getenv("API_WORKERS", 1))  # Each worker holds a full copy of the CLIP model
 
-    def get_image_dir(self):
-        """Get the correct image directory path based on environment"""
+    @cached_property
+    def resolved_image_dir(self) -> str:
+        """Image directory for this environment, resolved once since it cannot change after boot"""
         # Check if we're running in Docker by checking if the Docker path exists
-        if os.path.exists(self.DOCKER_IMAGE_DIR):
+        if os.path.isdir(self.DOCKER_IMAGE_DIR):
             return self.DOCKER_IMAGE_DIR
         return self.IMAGE_DIR
 
+    def get_image_dir(self):
+        """Get the correct image directory path based on environment"""
+        return self.resolved_image_dir
+
 # Create a global settings instance
 settings = Settings()
\ No newline at end of file
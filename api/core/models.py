@@ -1,9 +1,9 @@
-from pydantic import BaseModel, HttpUrl
-from typing import List, Optional
+from pydantic import BaseModel, Field, HttpUrl
+from typing import Dict, List, Optional
 
 class SearchRequest(BaseModel):
     query: str
-    top_k: int = 5
+    top_k: int = Field(5, ge=1, le=10)  # Bounds concurrent LLM calls per request; larger values get a 422
 
 class SearchResult(BaseModel):
     image_id: str
@@ -11,12 +11,19 @@ class SearchResult(BaseModel):
     score: float
     explanation: Optional[str] = None
     image_url: Optional[str] = None
+    thumbnail_b64: Optional[str] = None  # Pre-resized JPEG, absent when no thumbnail was generated
 
 class SearchResponse(BaseModel):
     results: List[SearchResult]
     query: str
     processing_time: float
 
+class ImageBatchRequest(BaseModel):
+    ids: List[str] = Field(max_length=10)  # One result page (frontend top_k max); larger requests get a 422
+
+class ImageBatchResponse(BaseModel):
+    images: Dict[str, str]  # filename -> base64-encoded file bytes
+
 class HealthResponse(BaseModel):
     status: str
     qdrant_connected: bool
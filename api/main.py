@@ -1,29 +1,34 @@
 from fastapi import FastAPI, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, ORJSONResponse, StreamingResponse
+import asyncio
+import orjson
 import time
-import os
 import logging
 from typing import List
 
 from api.core.config import settings
-from api.core.models import SearchRequest, SearchResponse, SearchResult, HealthResponse
+from api.core.models import SearchRequest, SearchResponse, SearchResult, HealthResponse, ImageBatchRequest, ImageBatchResponse
 from api.services.qdrant_service import qdrant_service
 from api.services.clip_client import clip_client
 from api.services.explanation_generator import explanation_generator
 
-from api.utils.image_utils import get_image_path
+from api.utils.image_utils import get_image_path, get_image_set, read_images_base64, read_thumbnails_base64
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Resolved once: the image directory cannot change after boot
+_IMG_PREFIX = settings.get_image_dir().rstrip("/") + "/"
+
 # Create FastAPI app
 app = FastAPI(
     title="Visual Search System API",
     description="Enterprise-grade visual search with AI explanations",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse  # C-level JSON encoding for search payloads
 )
 
 # Add CORS middleware
@@ -35,6 +40,16 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.post("/images/batch", response_model=ImageBatchResponse, tags=["Images"])
+async def get_images_batch(request: ImageBatchRequest):
+    """
+    Return several images in one response, keyed by filename.
+    Unknown filenames are omitted from the result.
+    """
+    # Registered before the /images mount, which would otherwise swallow this path
+    images = await asyncio.to_thread(read_images_base64, request.ids)
+    return ImageBatchResponse(images=images)
+
 # Mount static files for serving images
 app.mount("/images", StaticFiles(directory=settings.get_image_dir()), name="images")
 
@@ -64,30 +79,36 @@ async def search_images(request: SearchRequest):
     try:
         # Generate embedding for the text query
         logger.info(f"Processing query: {request.query}")
-        query_embedding = clip_client.get_text_embedding(request.query)
+        query_embedding = await clip_client.get_text_embedding(request.query)
         
         # Search for similar images in Qdrant
         search_results = qdrant_service.search_similar(query_embedding, top_k=request.top_k)
         
+        # Encode each thumbnail once: it is inlined for the frontend and reused as the LLM image
+        thumbnails = await asyncio.to_thread(read_thumbnails_base64, [filename for _, _, filename in search_results])
+        
+        # Generate AI explanations for all hits concurrently
+        tasks = [
+            explanation_generator.generate_explanation(get_image_path(filename), request.query, base64_image=thumbnail)
+            for (_, _, filename), thumbnail in zip(search_results, thumbnails)
+        ]
+        explanations = await asyncio.gather(*tasks, return_exceptions=True)
+        
         # Prepare results with explanations
         results = []
-        for result in search_results:
-            image_id = str(result["id"])
-            filename = result["payload"]["filename"]
-            #image_path = os.path.join(settings.IMAGE_DIR, filename)
-            
-            image_path = get_image_path(filename)
-            
-            # Generate AI explanation
-            explanation = explanation_generator.generate_explanation(image_path, request.query)
+        for (point_id, score, filename), explanation, thumbnail in zip(search_results, explanations, thumbnails):
+            if isinstance(explanation, Exception):
+                logger.error(f"Explanation failed for {filename}: {explanation}")
+                explanation = None
             
             # Create result object
             search_result = SearchResult(
-                image_id=image_id,
+                image_id=str(point_id),
                 filename=filename,
-                score=result["score"],
+                score=score,
                 explanation=explanation,
-                image_url=f"/images/{filename}"
+                image_url=f"/images/{filename}",
+                thumbnail_b64=thumbnail
             )
             results.append(search_result)
         
@@ -104,14 +125,71 @@ async def search_images(request: SearchRequest):
         logger.error(f"Search failed: {e}")
         raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
 
+@app.post("/search/stream", tags=["Search"])
+async def search_images_stream(request: SearchRequest):
+    """
+    Search for images and stream the results as Server-Sent Events.
+    Emits a `hits` event as soon as matches are known, one `explanation` event
+    per result as each LLM call completes, then a final `done` event.
+    """
+    start_time = time.time()
+    
+    try:
+        logger.info(f"Processing streaming query: {request.query}")
+        query_embedding = await clip_client.get_text_embedding(request.query)
+        search_results = qdrant_service.search_similar(query_embedding, top_k=request.top_k)
+        # Same thumbnails as /search: inlined in the hits and reused as the LLM image
+        thumbnails = await asyncio.to_thread(read_thumbnails_base64, [filename for _, _, filename in search_results])
+    except Exception as e:
+        logger.error(f"Search failed: {e}")
+        raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
+    
+    hits = [
+        SearchResult(
+            image_id=str(point_id),
+            filename=filename,
+            score=score,
+            image_url=f"/images/{filename}",
+            thumbnail_b64=thumbnail
+        )
+        for (point_id, score, filename), thumbnail in zip(search_results, thumbnails)
+    ]
+    
+    async def explain(hit: SearchResult):
+        explanation = await explanation_generator.generate_explanation(
+            get_image_path(hit.filename), request.query, base64_image=hit.thumbnail_b64
+        )
+        return {"image_id": hit.image_id, "explanation": explanation}
+    
+    async def event_stream():
+        yield f"event: hits\ndata: {orjson.dumps([hit.model_dump() for hit in hits]).decode()}\n\n"
+        
+        # Explicit tasks so a client disconnect (generator cancelled) stops the outstanding LLM calls
+        tasks = [asyncio.create_task(explain(hit)) for hit in hits]
+        try:
+            # generate_explanation returns None on failure, so every hit gets an event (possibly null)
+            for next_explanation in asyncio.as_completed(tasks):
+                payload = await next_explanation
+                yield f"event: explanation\ndata: {orjson.dumps(payload).decode()}\n\n"
+        finally:
+            for task in tasks:
+                task.cancel()
+        
+        processing_time = time.time() - start_time
+        logger.info(f"Streaming search completed in {processing_time:.2f} seconds")
+        yield f"event: done\ndata: {orjson.dumps({'processing_time': processing_time}).decode()}\n\n"
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
 @app.get("/image/{filename}", tags=["Images"])
 async def get_image(filename: str):
     """Serve an image file"""
-    image_path = os.path.join(settings.IMAGE_DIR, filename)
-
-    if not os.path.exists(image_path):
+    # Membership in the cached directory listing replaces a stat() per request;
+    # the periodic re-list of the whole catalog runs off the event loop
+    if filename not in await asyncio.to_thread(get_image_set):
         raise HTTPException(status_code=404, detail="Image not found")
-    return FileResponse(image_path)
+    
+    return FileResponse(_IMG_PREFIX + filename)
 
 @app.get("/api/health", response_model=HealthResponse, tags=["Health"])
 async def api_health():
@@ -123,13 +201,35 @@ async def api_health():
 async def startup_event():
     """Initialize services on startup"""
     logger.info("Starting up Visual Search System API...")
-    # Services are already initialized as global instances
+    # Services are already initialized as global instances; warm their first-hit paths
+    # so DNS/TLS setup and batcher start-up don't land on the first user request
+    try:
+        await explanation_generator.client.models.list()
+    except Exception as e:
+        logger.warning(f"OpenAI warmup failed: {e}")
+    
+    if not qdrant_service.check_health():
+        logger.warning("Qdrant warmup failed")
+    
+    try:
+        await clip_client.get_text_embedding("warmup")
+    except Exception as e:
+        logger.warning(f"CLIP warmup failed: {e}")
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Cleanup on shutdown"""
     logger.info("Shutting down Visual Search System API...")
+    await explanation_generator.aclose()
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host=settings.API_HOST, port=settings.API_PORT)
\ No newline at end of file
+    # uvloop/httptools replace the asyncio loop and h11 parser; each worker loads its own CLIP model
+    uvicorn.run(
+        "api.main:app",
+        host=settings.API_HOST,
+        port=settings.API_PORT,
+        loop="uvloop",
+        http="httptools",
+        workers=settings.API_WORKERS
+    )
\ No newline at end of file
@@ -1,80 +1,208 @@
 import torch
-from transformers import CLIPProcessor, CLIPModel
+from transformers import CLIPModel, CLIPTokenizerFast, CLIPImageProcessor
 from PIL import Image
 import numpy as np
-from typing import Union
+from typing import Union, List, Optional
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
 import logging
+import os
 from api.core.config import settings
 
+try:
+    import onnxruntime as ort
+except ImportError:  # Optional: the text tower falls back to PyTorch
+    ort = None
+
 logger = logging.getLogger(__name__)
 
 class CLIPClient:
     def __init__(self):
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        # Half precision halves weight/activation bandwidth on GPU; CPU kernels stay in fp32
+        self.dtype = torch.float16 if self.device == "cuda" else torch.float32
         self.model = None
-        self.processor = None
+        self.tokenizer = None
+        self.image_processor = None
+        self.text_session = None
+        # Query strings repeat heavily; CLIP text features are deterministic so cache them (LRU)
+        self._text_cache: "OrderedDict[str, bytes]" = OrderedDict()
+        # All inference runs on one dedicated thread so compiled graphs stay on the thread that built them
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="clip")
+        self._batch_queue: Optional[asyncio.Queue] = None
+        self._batch_worker: Optional[asyncio.Task] = None
         self.load_model()
 
     def load_model(self):
-        """Load the CLIP model and processor"""
+        """Load the CLIP model, tokenizer and image processor"""
         try:
             logger.info(f"Loading CLIP model: {settings.EMBEDDING_MODEL}")
-            self.model = CLIPModel.from_pretrained(settings.EMBEDDING_MODEL)
-            self.processor = CLIPProcessor.from_pretrained(settings.EMBEDDING_MODEL)
+            self.model = CLIPModel.from_pretrained(settings.EMBEDDING_MODEL, torch_dtype=self.dtype)
+            # Rust-backed tokenizer directly, instead of the Python CLIPProcessor wrapper
+            self.tokenizer = CLIPTokenizerFast.from_pretrained(settings.EMBEDDING_MODEL)
+            self.image_processor = CLIPImageProcessor.from_pretrained(settings.EMBEDDING_MODEL)
             
             self.model.to(self.device)
             self.model.eval()
             
-            logger.info(f"CLIP model loaded successfully on device: {self.device}")
+            if self.device == "cuda":
+                # Compile the feature methods we actually call (torch.compile only wraps forward())
+                self.model.get_text_features = torch.compile(
+                    self.model.get_text_features, mode="reduce-overhead", fullgraph=False
+                )
+                self.model.get_image_features = torch.compile(
+                    self.model.get_image_features, mode="reduce-overhead", fullgraph=False
+                )
+            
+            logger.info(f"CLIP model loaded successfully on device: {self.device} ({self.dtype})")
+            
+            self.load_onnx_text_model()
+            
+            # Dummy forward pass so compilation and kernel autotuning happen before serving
+            self._executor.submit(self._compute_text_embeddings, ["warmup"]).result()
             
         except Exception as e:
             logger.error(f"Failed to load CLIP model: {e}")
             raise
 
+    def load_onnx_text_model(self):
+        """Serve the text tower from ONNX Runtime when an exported model is available"""
+        onnx_path = os.path.join(settings.CLIP_ONNX_DIR, "text_model.onnx")
+        if ort is None or not os.path.exists(onnx_path):
+            return
+        
+        sess_options = ort.SessionOptions()
+        # Constant folding, LayerNorm/GEMM fusion and weight prepacking
+        sess_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        available = ort.get_available_providers()
+        providers = [p for p in ("CUDAExecutionProvider", "CPUExecutionProvider") if p in available]
+        
+        self.text_session = ort.InferenceSession(onnx_path, sess_options=sess_options, providers=providers)
+        logger.info(f"CLIP text model served by ONNX Runtime from {onnx_path} ({providers[0]})")
+
+    def _to_device(self, inputs) -> dict:
+        """Move processor outputs to the model device, casting float tensors to the model dtype"""
+        if self.device == "cuda":
+            # Pinned host memory lets the copy run asynchronously with non_blocking=True
+            inputs = {k: v.pin_memory() for k, v in inputs.items()}
+        return {
+            k: v.to(self.device, dtype=self.dtype if v.is_floating_point() else v.dtype, non_blocking=True)
+            for k, v in inputs.items()
+        }
+
+    @staticmethod
+    def _l2_normalize(features: np.ndarray) -> np.ndarray:
+        """L2-normalize rows in place on the host (saves a reduction + divide kernel launch on GPU)"""
+        features *= 1.0 / np.linalg.norm(features, axis=1, keepdims=True)
+        return features
+
+    def _embed_images(self, images: List[Image.Image]) -> np.ndarray:
+        """Embed a list of RGB images in a single batched forward pass"""
+        with torch.inference_mode():
+            inputs = self._to_device(self.image_processor(images=images, return_tensors="pt"))
+            image_features = self.model.get_image_features(**inputs)
+            
+        return self._l2_normalize(image_features.cpu().numpy().astype(np.float32))
+
+    def _run_image_inference(self, images: List[Image.Image]) -> np.ndarray:
+        """Embed images on the inference thread, where the compiled graphs were built"""
+        return self._executor.submit(self._embed_images, images).result()
+
     def get_image_embedding(self, image_path: str) -> np.ndarray:
         """Generate embedding for an image"""
         try:
-            image = Image.open(image_path)
-            
-            with torch.no_grad():
-                inputs = self.processor(images=image, return_tensors="pt").to(self.device)
-                image_features = self.model.get_image_features(**inputs)
-                image_features = image_features / image_features.norm(dim=1, keepdim=True)
-                
-            return image_features.cpu().numpy().astype(np.float32).squeeze()
+            return self._run_image_inference([Image.open(image_path).convert("RGB")])[0]
             
         except Exception as e:
             logger.error(f"Failed to generate image embedding for {image_path}: {e}")
             raise
 
-    def get_text_embedding(self, text: str) -> np.ndarray:
-        """Generate embedding for text"""
+    async def get_text_embedding(self, text: str) -> np.ndarray:
+        """Generate embedding for text, micro-batched with other queries arriving in the same window"""
+        cached = self._text_cache.get(text)
+        if cached is None:
+            if self._batch_queue is None:
+                self._start_batcher()
+            future = asyncio.get_running_loop().create_future()
+            await self._batch_queue.put((text, future))
+            cached = (await future).tobytes()
+            self._cache_text_embedding(text, cached)
+        else:
+            self._text_cache.move_to_end(text)
+        # Cache holds immutable bytes so callers can never mutate a shared entry
+        return np.frombuffer(cached, dtype=np.float32).reshape(settings.EMBEDDING_SIZE)
+
+    def _cache_text_embedding(self, text: str, embedding: bytes):
+        self._text_cache[text] = embedding
+        self._text_cache.move_to_end(text)
+        if len(self._text_cache) > settings.TEXT_EMBEDDING_CACHE_SIZE:
+            self._text_cache.popitem(last=False)
+
+    def _start_batcher(self):
+        """Create the request queue and background batching task on the running event loop"""
+        self._batch_queue = asyncio.Queue()
+        self._batch_worker = asyncio.get_running_loop().create_task(self._run_text_batcher())
+
+    async def _run_text_batcher(self):
+        """Collect queries for up to TEXT_BATCH_WINDOW_MS and embed them in one padded forward pass"""
+        loop = asyncio.get_running_loop()
+        window = settings.TEXT_BATCH_WINDOW_MS / 1000
+        
+        while True:
+            items = [await self._batch_queue.get()]
+            deadline = loop.time() + window
+            while len(items) < settings.TEXT_BATCH_MAX_SIZE:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    items.append(await asyncio.wait_for(self._batch_queue.get(), timeout=timeout))
+                except asyncio.TimeoutError:
+                    break
+            
+            # Identical queries in the same window share one row of the batch
+            texts = list(dict.fromkeys(text for text, _ in items))
+            try:
+                embeddings = await loop.run_in_executor(self._executor, self._compute_text_embeddings, texts)
+            except Exception as e:
+                for _, future in items:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            
+            rows = dict(zip(texts, embeddings))
+            for text, future in items:
+                if not future.done():
+                    future.set_result(rows[text])
+
+    def _compute_text_embeddings(self, texts: List[str]) -> np.ndarray:
+        """Run the CLIP text tower over a batch of queries"""
         try:
-            with torch.no_grad():
-                inputs = self.processor(text=text, return_tensors="pt", padding=True).to(self.device)
+            if self.text_session is not None:
+                ids = self.tokenizer(texts, padding="max_length", max_length=77, truncation=True, return_tensors="np")
+                text_features = self.text_session.run(
+                    None, {"input_ids": ids["input_ids"], "attention_mask": ids["attention_mask"]}
+                )[0].astype(np.float32)
+                return self._l2_normalize(text_features)
+            
+            with torch.inference_mode():
+                # Fixed 77-token padding gives the text tower one stable input shape
+                inputs = self._to_device(
+                    self.tokenizer(texts, padding="max_length", max_length=77, truncation=True, return_tensors="pt")
+                )
                 text_features = self.model.get_text_features(**inputs)
-                text_features = text_features / text_features.norm(dim=1, keepdim=True)
                 
-            return text_features.cpu().numpy().astype(np.float32).squeeze()
+            return self._l2_normalize(text_features.cpu().numpy().astype(np.float32))
             
         except Exception as e:
-            logger.error(f"Failed to generate text embedding for '{text}': {e}")
+            logger.error(f"Failed to generate text embeddings for {texts}: {e}")
             raise
 
-    def batch_process_images(self, image_paths: list) -> list:
+    def batch_process_images(self, image_paths: list) -> np.ndarray:
         """Process multiple images in a batch (more efficient)"""
         try:
-            
-            images = [Image.open(path).convert("RGB") for path in image_paths]
-
-            
-            with torch.no_grad():
-                print("--- CLIP CLIENT: RUNNING NEW VERSION WITH PADDING ---") 
-                inputs = self.processor(images=images, return_tensors="pt", padding=True).to(self.device)
-                image_features = self.model.get_image_features(**inputs)
-                image_features = image_features / image_features.norm(dim=1, keepdim=True)
-                
-            return image_features.cpu().numpy().astype(np.float32)
+            return self._run_image_inference([Image.open(path).convert("RGB") for path in image_paths])
             
         except Exception as e:
             logger.error(f"Batch processing failed: {e}")
@@ -1,35 +1,60 @@
+import asyncio
 import base64
 import logging
-from openai import OpenAI
+import httpx
+from openai import AsyncOpenAI
 from PIL import Image
 import io
+import os
+import threading
 from typing import Optional
 from api.core.config import settings
+from api.utils.image_utils import get_thumb_path
 
 
 
 logger = logging.getLogger(__name__)
 
+# Static instructions go in the system message so every call shares an identical, cacheable prefix
+SYSTEM_INSTRUCTION = (
+    "You are an AI visual search analyst. Explain why the image is a relevant result for the user's query "
+    "in 1-2 concise, business-appropriate sentences, referring to specific visual elements "
+    "(objects, colors, actions), attributes (style, lighting, composition) and context (setting, scene, atmosphere). "
+    "Focus on the aspects that connect the image to the query. Do not use markdown. Just return the explanation."
+)
+PROMPT_CACHE_KEY = "visual-search-explain-v1"
+
 class ExplanationGenerator:
     def __init__(self):
-        self.client = OpenAI(api_key=settings.OPENAI_API_KEY)
+        # Long-lived HTTP/2 pool: concurrent explanations multiplex over warm connections
+        self._http = httpx.AsyncClient(
+            http2=True,
+            timeout=30.0,
+            limits=httpx.Limits(max_connections=64, max_keepalive_connections=64)
+        )
+        self.client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY, http_client=self._http)
+        # Per-thread JPEG buffer reused across encodes (encoding runs in worker threads)
+        self._tls = threading.local()
         self.model_name = settings.EXPLANATION_MODEL
 
-    def generate_explanation(self, image_path: str, query: str) -> Optional[str]:
+    async def generate_explanation(self, image_path: str, query: str, base64_image: Optional[str] = None) -> Optional[str]:
         """
         Generate an explanation for why the image is relevant to the query using GPT-4o-mini.
+        Pass base64_image (a JPEG) when the caller has already encoded the image.
         """
         try:
-            # Encode image to base64
-            base64_image = self._encode_image_to_base64(image_path)
+            if base64_image is None:
+                # Encode image to base64 off the event loop so it overlaps other requests' network waits
+                base64_image = await asyncio.to_thread(self._encode_image_to_base64, image_path)
             
             # Create the prompt
             prompt = self._create_prompt(query)
             
             # Call OpenAI API
-            response = self.client.chat.completions.create(
+            response = await self.client.chat.completions.create(
                 model=self.model_name,
                 messages=[
+                    {"role": "system", "content": SYSTEM_INSTRUCTION},
                     {
                         "role": "user",
                         "content": [
@@ -44,7 +69,8 @@ class ExplanationGenerator:
                     }
                 ],
                 max_tokens=150,
-                temperature=0.2  # Lower temperature for more factual responses
+                temperature=0.2,  # Lower temperature for more factual responses
+                extra_body={"prompt_cache_key": PROMPT_CACHE_KEY}
             )
             
             explanation = response.choices[0].message.content
@@ -55,41 +81,49 @@ class ExplanationGenerator:
             logger.error(f"Failed to generate explanation for {image_path}: {e}")
             return None
 
+    async def aclose(self):
+        """Close the shared HTTP connection pool"""
+        await self._http.aclose()
+
     def _encode_image_to_base64(self, image_path: str) -> str:
         """Encode image to base64 string"""
         try:
+            # Thumbnails pre-generated at ingest are already LLM-sized JPEGs: no decode or resize needed
+            thumb_path = get_thumb_path(os.path.basename(image_path))
+            if os.path.exists(thumb_path):
+                with open(thumb_path, 'rb') as f:
+                    return base64.b64encode(f.read()).decode('ascii')
+            
             with Image.open(image_path) as img:
-                # Convert to RGB if necessary
-                if img.mode in ('RGBA', 'P'):
-                    img = img.convert('RGB')
+                # Let libjpeg downscale during decode (DCT scaling) instead of decoding full resolution
+                img.draft("RGB", (512, 512))
+                img = img.convert("RGB")
                 
                 # Resize for efficiency (optional, but reduces token usage)
-                img.thumbnail((512, 512))
+                img.thumbnail((512, 512), Image.BILINEAR)
                 
-                # Convert to base64
-                buffered = io.BytesIO()
-                img.save(buffered, format="JPEG", quality=85)
-                return base64.b64encode(buffered.getvalue()).decode('utf-8')
+                # Convert to base64 (single-pass baseline encode, zero-copy view of the buffer)
+                buffered = self._get_buffer()
+                img.save(buffered, format="JPEG", quality=85, optimize=False, progressive=False)
+                with buffered.getbuffer() as view:
+                    return base64.b64encode(view).decode('ascii')
                 
         except Exception as e:
             logger.error(f"Failed to encode image {image_path}: {e}")
             raise
 
-    def _create_prompt(self, query: str) -> str:
-        """Create the prompt for the LLM"""
-        return f"""
-        You are an AI visual search analyst. Explain why this image is a relevant result for the user's query: '{query}'.
+    def _get_buffer(self) -> io.BytesIO:
+        """Get this thread's reusable encode buffer, emptied for a new image"""
+        buffered = getattr(self._tls, 'buffer', None)
+        if buffered is None:
+            buffered = self._tls.buffer = io.BytesIO()
+        buffered.seek(0)
+        buffered.truncate()
+        return buffered
 
-        Your explanation must be:
-        - Concise (1-2 sentences)
-        - Business-appropriate and technically sound
-        - Refer to specific visual elements (objects, colors, actions)
-        - Mention attributes (style, lighting, composition)
-        - Describe the context (setting, scene, atmosphere)
-
-        Focus on the most relevant aspects that connect the image to the query.
-        Do not use markdown. Just return the explanation.
-        """
+    def _create_prompt(self, query: str) -> str:
+        """Create the per-query part of the prompt (instructions live in SYSTEM_INSTRUCTION)"""
+        return f"Query: {query}"
 
 # Create a global instance
 explanation_generator = ExplanationGenerator()
\ No newline at end of file
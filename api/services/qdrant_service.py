@@ -1,8 +1,9 @@
 from qdrant_client import QdrantClient, models
 from qdrant_client.http.exceptions import UnexpectedResponse
 import numpy as np
-from typing import List, Optional
+from typing import List, Optional, Tuple, Union
 from api.core.config import settings
+from api.utils.qdrant_utils import image_collection_config
 import logging
 
 logger = logging.getLogger(__name__)
@@ -21,9 +22,12 @@ class QdrantService:
             self.client = QdrantClient(
                 host=settings.QDRANT_HOST,
                 port=settings.QDRANT_PORT,
+                grpc_port=settings.QDRANT_GRPC_PORT,
+                prefer_grpc=settings.QDRANT_PREFER_GRPC,  # Protobuf framing instead of JSON for vectors
                 timeout=60  # Increased timeout for operations
             )
-            logger.info(f"Connected to Qdrant at {settings.QDRANT_HOST}:{settings.QDRANT_PORT}")
+            transport = f"gRPC :{settings.QDRANT_GRPC_PORT}" if settings.QDRANT_PREFER_GRPC else "HTTP"
+            logger.info(f"Connected to Qdrant at {settings.QDRANT_HOST}:{settings.QDRANT_PORT} ({transport})")
         except Exception as e:
             logger.error(f"Failed to connect to Qdrant: {e}")
             raise
@@ -33,14 +37,13 @@ class QdrantService:
         try:
             collections = self.client.get_collections().collections
             collection_names = [col.name for col in collections]
+            # scripts/generate_embeddings.py publishes the collection under an alias
+            collection_names += [alias.alias_name for alias in self.client.get_aliases().aliases]
             
             if self.collection_name not in collection_names:
                 self.client.create_collection(
                     collection_name=self.collection_name,
-                    vectors_config=models.VectorParams(
-                        size=self.embedding_size,
-                        distance=models.Distance.COSINE
-                    )
+                    **image_collection_config(self.embedding_size)
                 )
                 logger.info(f"Created collection: {self.collection_name}")
             else:
@@ -77,27 +80,23 @@ class QdrantService:
             logger.error(f"Failed to upsert embeddings: {e}")
             return False
 
-    def search_similar(self, query_vector: np.ndarray, top_k: int = 5) -> List[dict]:
-        """Search for similar vectors"""
+    def search_similar(self, query_vector: np.ndarray, top_k: int = 5) -> List[Tuple[Union[int, str], float, str]]:
+        """Search for similar vectors, returning (id, score, filename) per hit"""
         try:
-            if hasattr(query_vector, 'tolist'):
-                query_vector = query_vector.tolist()
-            
-            search_results = self.client.search(
+            # The ndarray is passed as-is; qdrant-client converts it to a list internally when building the request
+            search_results = self.client.query_points(
                 collection_name=self.collection_name,
-                query_vector=query_vector,
-                limit=top_k
-            )
-            
-            results = []
-            for result in search_results:
-                results.append({
-                    "id": result.id,
-                    "score": result.score,
-                    "payload": result.payload
-                })
+                query=query_vector,
+                limit=top_k,
+                with_payload=["filename"],  # Only the field the API returns
+                with_vectors=False,
+                # Rescore the oversampled int8 candidates against the full vectors for accurate top-k
+                search_params=models.SearchParams(
+                    quantization=models.QuantizationSearchParams(rescore=True, oversampling=2.0)
+                )
+            ).points
             
-            return results
+            return [(point.id, point.score, point.payload["filename"]) for point in search_results]
             
         except Exception as e:
             logger.error(f"Search failed: {e}")
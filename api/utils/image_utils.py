@@ -1,4 +1,7 @@
 import os
+import base64
+import time
+from functools import lru_cache
 from PIL import Image
 import numpy as np
 from api.core.config import settings
@@ -11,11 +14,44 @@ def get_image_files() -> list:
     image_files = []
     
     for filename in os.listdir(image_dir):
-        if any(filename.lower().endswith(ext) for ext in image_extensions):
+        if os.path.splitext(filename)[1].lower() in image_extensions:
             image_files.append(os.path.join(image_dir, filename))
     
     return sorted(image_files)
 
+@lru_cache(maxsize=1)
+def _image_set(ttl_bucket: int) -> frozenset:
+    """Directory listing for one TTL window; a new bucket value evicts the previous listing"""
+    try:
+        return frozenset(os.listdir(settings.get_image_dir()))
+    except FileNotFoundError:
+        return frozenset()  # No image directory means no images (404s), not a server error
+
+def get_image_set() -> frozenset:
+    """Get the set of filenames in the image directory, refreshed every IMAGE_LIST_TTL seconds"""
+    return _image_set(int(time.monotonic() // settings.IMAGE_LIST_TTL))
+
+def read_images_base64(filenames: list) -> dict:
+    """Read known image files and base64-encode them, skipping names not in the image directory"""
+    image_set = get_image_set()
+    images = {}
+    for filename in filenames:
+        if filename in image_set:
+            with open(get_image_path(filename), 'rb') as f:
+                images[filename] = base64.b64encode(f.read()).decode('ascii')
+    return images
+
+def read_thumbnails_base64(filenames: list) -> list:
+    """Base64-encode the pre-generated thumbnail of each file, None where no thumbnail exists"""
+    thumbnails = []
+    for filename in filenames:
+        try:
+            with open(get_thumb_path(filename), 'rb') as f:
+                thumbnails.append(base64.b64encode(f.read()).decode('ascii'))
+        except OSError:
+            thumbnails.append(None)
+    return thumbnails
+
 def validate_image(image_path: str) -> bool:
     """Validate if a file is a valid image"""
     try:
@@ -32,4 +68,8 @@ def get_image_id_from_path(image_path: str) -> str:
 
 def get_image_path(filename: str) -> str:
     """Get full path to an image file"""
-    return os.path.join(settings.get_image_dir(), filename)
\ No newline at end of file
+    return os.path.join(settings.resolved_image_dir, filename)
+
+def get_thumb_path(filename: str) -> str:
+    """Get path of the pre-resized thumbnail generated for an image file"""
+    return os.path.join(settings.THUMB_DIR, filename + '.jpg')
@@ -1,13 +1,91 @@
 import streamlit as st
 import requests
-import time
-from PIL import Image
-import io
+from requests.adapters import HTTPAdapter
 import base64
+import asyncio
+import threading
+import aiohttp
 
 # Configuration
 API_URL = "http://api:8000"  # For Docker compose
 # API_URL = "http://localhost:8000"  # For local development
+GRID_COLUMNS = 2  # Results per row
+
+class AsyncAPIClient:
+    """aiohttp session running on its own event loop thread, so it survives Streamlit reruns"""
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, daemon=True).start()
+        self.session = self.run(self._create_session())
+
+    async def _create_session(self):
+        return aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=16))
+
+    def run(self, coro):
+        """Run a coroutine on the client loop and block the script thread until it finishes"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    async def search(self, query: str, top_k: int):
+        """POST /search, returning (status, JSON body or error text)"""
+        async with self.session.post(
+            f"{API_URL}/search",
+            json={"query": query, "top_k": top_k},
+            timeout=aiohttp.ClientTimeout(total=30)
+        ) as response:
+            if response.status == 200:
+                return response.status, await response.json()
+            return response.status, await response.text()
+
+    async def fetch_images(self, ids) -> dict:
+        """POST /images/batch, returning {filename: base64 image bytes}"""
+        async with self.session.post(
+            f"{API_URL}/images/batch",
+            json={"ids": list(ids)},
+            timeout=aiohttp.ClientTimeout(total=10)
+        ) as response:
+            response.raise_for_status()
+            return (await response.json())["images"]
+
+@st.cache_resource
+def get_session() -> requests.Session:
+    """Keep-alive pool for the blocking health check; the script body re-runs, so it lives in the resource cache"""
+    session = requests.Session()
+    session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=8))
+    return session
+
+@st.cache_resource
+def get_async_client() -> AsyncAPIClient:
+    return AsyncAPIClient()
+
+@st.cache_data(ttl=600, max_entries=256, show_spinner=False)
+def fetch_images(ids: tuple) -> dict:
+    """Download a result set's images in one request; reruns with the same results are served from the cache"""
+    # A failed request raises, so errors are never cached
+    client = get_async_client()
+    images = client.run(client.fetch_images(ids))
+    return {filename: base64.b64decode(data) for filename, data in images.items()}
+
+@st.cache_data(ttl=15, show_spinner=False)
+def fetch_health():
+    """Health status of the API, or None if it responded with an error"""
+    health_response = get_session().get(f"{API_URL}/api/health", timeout=5)
+    if health_response.status_code != 200:
+        return None
+    return health_response.json()
+
+@st.fragment(run_every=30)
+def health_panel():
+    """Sidebar health status; reruns as a fragment so it never blocks the search UI"""
+    try:
+        health_data = fetch_health()
+        if health_data is not None:
+            st.success("System is healthy")
+            st.write(f"**Qdrant Connected:** {'Ok' if health_data['qdrant_connected'] else 'Not Ok'}")
+            st.write(f"**CLIP Model Loaded:** {'Ok' if health_data['clip_model_loaded'] else 'Not Ok'}")
+        else:
+            st.error("API is not responding")
+    except:
+        st.error("Cannot connect to API")
 
 def main():
     st.set_page_config(
@@ -72,62 +150,61 @@ def main():
         with st.spinner("🔍 Searching for relevant images..."):
             try:
                 # Call the search API
-                start_time = time.time()
-                response = requests.post(
-                    f"{API_URL}/search",
-                    json={"query": query, "top_k": top_k},
-                    timeout=30
-                )
+                client = get_async_client()
+                status, results = client.run(client.search(query, int(top_k)))
                 
-                if response.status_code == 200:
-                    results = response.json()
+                if status == 200:
                     processing_time = results["processing_time"]
                     
                     st.success(f"Found {len(results['results'])} results in {processing_time:.2f} seconds")
                     
-                    # Display results in a grid
-                    for i, result in enumerate(results["results"], 1):
-                        with st.container():
-                            col1, col2 = st.columns([1, 2])
-                            
-                            with col1:
-                                # Display image
+                    # Use inlined thumbnails; only results without one need a (single, batched) image request
+                    images = {
+                        r["filename"]: base64.b64decode(r["thumbnail_b64"])
+                        for r in results["results"] if r.get("thumbnail_b64")
+                    }
+                    ids = tuple(r["filename"] for r in results["results"] if r["filename"] not in images)
+                    image_error = None
+                    if ids:
+                        try:
+                            images.update(fetch_images(ids))
+                        except Exception as e:
+                            image_error = e
+                    
+                    # Display results in a grid, GRID_COLUMNS results per row
+                    ranked = list(enumerate(results["results"], 1))
+                    for row_start in range(0, len(ranked), GRID_COLUMNS):
+                        for cell, (i, result) in zip(st.columns(GRID_COLUMNS), ranked[row_start:row_start + GRID_COLUMNS]):
+                            with cell:
+                                # Display image; encoded bytes go to the browser as-is, no PIL decode/re-encode
                                 try:
-                                    image_url = f"{API_URL}{result['image_url']}"
-                                    image_response = requests.get(image_url, timeout=10)
-                                    
-                                    if image_response.status_code == 200:
-                                        image = Image.open(io.BytesIO(image_response.content))
-                                        st.image(
-                                            image,
-                                            caption=f"Result {i}",
-                                            use_column_width=True
-                                        )
-                                    else:
-                                        st.error("Failed to load image")
+                                    if result["filename"] not in images:
+                                        raise image_error or FileNotFoundError(result["filename"])
+                                    st.image(images[result["filename"]], caption=f"Result {i}", use_column_width=True)
                                 except Exception as e:
+                                    # A corrupt file only blanks its own card, not the rest of the grid
                                     st.error(f"Error loading image: {e}")
-                            
-                            with col2:
+                                
                                 # Display result information
-                                st.markdown(f"### Result {i}")
-                                st.markdown(f"**Filename:** `{result['filename']}`")
-                                st.markdown(f"**Relevance score:** <span class='score-badge'>{result['score']:.3f}</span>", 
-                                           unsafe_allow_html=True)
+                                st.markdown(
+                                    f"### Result {i}\n"
+                                    f"**Filename:** `{result['filename']}`  \n"
+                                    f"**Relevance score:** <span class='score-badge'>{result['score']:.3f}</span>",
+                                    unsafe_allow_html=True
+                                )
                                 
                                 # Display AI explanation
                                 if result['explanation']:
-                                    st.markdown("** AI Explanation:**")
-                                    st.info(result['explanation'])
+                                    st.info(f"**AI Explanation:** {result['explanation']}")
                                 else:
                                     st.warning("No explanation available")
-                            
-                            st.divider()
+                        
+                        st.divider()
                 
                 else:
-                    st.error(f"Search failed: {response.text}")
+                    st.error(f"Search failed: {results}")
                     
-            except requests.exceptions.RequestException as e:
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
                 st.error(f"Failed to connect to the search API: {e}")
             except Exception as e:
                 st.error(f"An unexpected error occurred: {e}")
@@ -136,18 +213,8 @@ def main():
     with st.sidebar:
         st.header("System Information")
         
-        # Health check
-        try:
-            health_response = requests.get(f"{API_URL}/api/health", timeout=5)
-            if health_response.status_code == 200:
-                health_data = health_response.json()
-                st.success("System is healthy")
-                st.write(f"**Qdrant Connected:** {'Ok' if health_data['qdrant_connected'] else 'Not Ok'}")
-                st.write(f"**CLIP Model Loaded:** {'Ok' if health_data['clip_model_loaded'] else 'Not Ok'}")
-            else:
-                st.error("API is not responding")
-        except:
-            st.error("Cannot connect to API")
+        # Health check (refreshes on its own timer, not on every widget interaction)
+        health_panel()
         
         st.divider()
         st.header("How to Use")
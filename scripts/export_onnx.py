@@ -0,0 +1,60 @@
+"""
+ONNX Export for the CLIP Text Encoder
+--------------------------------
+This script exports the CLIP text tower (text model + projection) to ONNX so
+the API can serve query embeddings from ONNX Runtime.
+
+Requirements:
+    pip install onnx onnxruntime
+
+Usage:
+    1. Run the script from the project root: python -m scripts.export_onnx
+    2. The model is written to CLIP_ONNX_DIR/text_model.onnx (default: 'clip_onnx')
+    3. Restart the API; it picks up the ONNX model automatically
+
+Note:
+    - Inputs are input_ids/attention_mask padded to 77 tokens, batch size is dynamic
+    - Outputs are unnormalized text features; the API applies the L2 normalization
+"""
+
+import os
+import torch
+from transformers import CLIPModel, CLIPTokenizerFast
+
+from api.core.config import settings
+
+class TextFeatures(torch.nn.Module):
+    """Wraps get_text_features so it is exported as the module's forward()"""
+    def __init__(self, model: CLIPModel):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask):
+        return self.model.get_text_features(input_ids=input_ids, attention_mask=attention_mask)
+
+def export_text_model(output_dir=settings.CLIP_ONNX_DIR):
+    """Export the CLIP text encoder to output_dir/text_model.onnx"""
+    os.makedirs(output_dir, exist_ok=True)
+    output_path = os.path.join(output_dir, "text_model.onnx")
+    
+    print(f"Loading CLIP model '{settings.EMBEDDING_MODEL}'...")
+    model = CLIPModel.from_pretrained(settings.EMBEDDING_MODEL).eval()
+    tokenizer = CLIPTokenizerFast.from_pretrained(settings.EMBEDDING_MODEL)
+    
+    dummy = tokenizer(["a photo of a dog"], padding="max_length", max_length=77, truncation=True, return_tensors="pt")
+    
+    print(f"Exporting text encoder to {output_path}...")
+    with torch.no_grad():
+        torch.onnx.export(
+            TextFeatures(model),
+            (dummy["input_ids"], dummy["attention_mask"]),
+            output_path,
+            input_names=["input_ids", "attention_mask"],
+            output_names=["text_embeds"],
+            dynamic_axes={"input_ids": {0: "batch"}, "attention_mask": {0: "batch"}, "text_embeds": {0: "batch"}},
+            opset_version=17
+        )
+    print("Export complete.")
+
+if __name__ == "__main__":
+    export_text_model()
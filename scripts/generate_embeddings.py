@@ -1,11 +1,36 @@
+"""
+Embedding Generator for the Image Collection
+--------------------------------
+This script embeds every image in IMAGE_DIR with CLIP and uploads the vectors
+to Qdrant under the 'image_embeddings' alias.
+
+Usage:
+    1. Download the images first (scripts/download_images.py)
+    2. Run the script from the project root: python -m scripts.generate_embeddings
+       (it imports the shared collection schema from the 'api' package)
+    3. Optionally pass --batch-size N; by default it is sized to free GPU memory
+
+Note:
+    - Each run builds a new timestamped collection and swaps the alias to it at the end,
+      so the API keeps serving the previous collection until the new one is complete
+"""
+
 import os
+import time
+import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import torch
+import torch.nn.functional as F
 from PIL import Image
+from torch.utils.data import Dataset, DataLoader
 from tqdm import tqdm
-from transformers import CLIPModel, CLIPProcessor
+from transformers import CLIPModel, CLIPImageProcessor
 from qdrant_client import QdrantClient, models
 import logging
 
+from api.utils.qdrant_utils import image_collection_config
+
 # --- Configuration ---
 # All settings are now in one place for clarity
 class Config:
@@ -15,8 +40,181 @@ class Config:
     COLLECTION_NAME = "image_embeddings"
     QDRANT_HOST = "localhost"
     QDRANT_PORT = 6333
+    MIN_BATCH_SIZE = 16
+    MAX_BATCH_SIZE = 256
+    VRAM_BUDGET = 0.6  # Fraction of free GPU memory the adaptive batch size may fill
+    NUM_WORKERS = min(8, os.cpu_count() or 1)  # Decode/preprocess processes feeding the GPU
+    MAX_PENDING_UPSERTS = 4  # Upserts allowed in flight while the next batches are embedded
+    INDEXING_THRESHOLD = 20000  # Qdrant default, restored once all points are uploaded
+
+class ImageDataset(Dataset):
+    """Decodes and preprocesses images in DataLoader workers, off the inference loop"""
+    def __init__(self, image_entries: list, processor: CLIPImageProcessor):
+        self.image_entries = image_entries  # (path, filename) pairs, precomputed once
+        self.processor = processor
+
+    def __len__(self):
+        return len(self.image_entries)
+
+    def __getitem__(self, i):
+        path, filename = self.image_entries[i]
+        try:
+            img = Image.open(path).convert("RGB")
+        except Exception as e:
+            logging.getLogger(__name__).warning(f"⚠️ Skipping invalid image {filename}: {e}")
+            return None
+        pixel_values = self.processor(images=img, return_tensors="pt")["pixel_values"][0]
+        return pixel_values, filename
+
+def collate_valid(samples: list):
+    """Stack the images that decoded successfully, dropping the invalid ones"""
+    samples = [s for s in samples if s is not None]
+    if not samples:
+        return None
+    pixel_values, filenames = zip(*samples)
+    return torch.stack(pixel_values), list(filenames)
+
+def swap_alias(client: QdrantClient, collection_name: str, logger: logging.Logger):
+    """Atomically point the COLLECTION_NAME alias at collection_name and drop the collection it replaced"""
+    previous = next(
+        (a.collection_name for a in client.get_aliases().aliases if a.alias_name == Config.COLLECTION_NAME),
+        None
+    )
+    if previous is None and client.collection_exists(Config.COLLECTION_NAME):
+        # One-time migration: an alias cannot share its name with a real collection
+        logger.warning(f"Replacing legacy collection '{Config.COLLECTION_NAME}' with an alias")
+        client.delete_collection(Config.COLLECTION_NAME)
+    
+    operations = []
+    if previous is not None:
+        operations.append(models.DeleteAliasOperation(delete_alias=models.DeleteAlias(alias_name=Config.COLLECTION_NAME)))
+    operations.append(models.CreateAliasOperation(
+        create_alias=models.CreateAlias(collection_name=collection_name, alias_name=Config.COLLECTION_NAME)
+    ))
+    client.update_collection_aliases(change_aliases_operations=operations)
+    logger.info(f" Alias '{Config.COLLECTION_NAME}' now points to '{collection_name}'.")
+    
+    if previous is not None and previous != collection_name:
+        client.delete_collection(previous)
+
+def pick_batch_size(model: CLIPModel, processor: CLIPImageProcessor, device: str) -> int:
+    """Largest batch that fits the free VRAM budget, estimated from one probe forward pass"""
+    if device != "cuda":
+        return Config.MIN_BATCH_SIZE
+    
+    probe = torch.zeros(
+        Config.MIN_BATCH_SIZE, 3, processor.crop_size["height"], processor.crop_size["width"],
+        device=device
+    ).to(memory_format=torch.channels_last)
+    torch.cuda.synchronize()
+    torch.cuda.reset_peak_memory_stats()
+    baseline = torch.cuda.memory_allocated()
+    with torch.inference_mode(), torch.autocast("cuda", dtype=torch.float16):
+        model.get_image_features(pixel_values=probe)
+    per_image_bytes = max(1, (torch.cuda.max_memory_allocated() - baseline) // Config.MIN_BATCH_SIZE)
+    del probe
+    torch.cuda.empty_cache()
+    
+    free, _ = torch.cuda.mem_get_info()
+    return min(Config.MAX_BATCH_SIZE, max(Config.MIN_BATCH_SIZE, int(free * Config.VRAM_BUDGET / per_image_bytes)))
+
+def embed_images(client: QdrantClient, collection_name: str, batch_size: int, logger: logging.Logger) -> int:
+    """Embed every image in IMAGE_DIR into collection_name, returning the number of points stored"""
+    # --- 3. Load CLIP Model ---
+    logger.info(f"Loading CLIP model '{Config.EMBEDDING_MODEL}'...")
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    model = CLIPModel.from_pretrained(Config.EMBEDDING_MODEL)
+    # Image-only preprocessing: no tokenizer to load and no text padding pass
+    processor = CLIPImageProcessor.from_pretrained(Config.EMBEDDING_MODEL)
+    model.to(device)
+    model.eval()
+    if device == "cuda":
+        # NHWC lets cuDNN pick tensor-core kernels for the patch-embedding convolution
+        model.to(memory_format=torch.channels_last)
+    # Probe before compiling so the measurement doesn't trigger a compile for the probe shape
+    if batch_size is None:
+        batch_size = pick_batch_size(model, processor, device)
+    if device == "cuda":
+        # Compile the feature method we actually call (torch.compile only wraps forward())
+        model.get_image_features = torch.compile(model.get_image_features, mode="reduce-overhead")
+    logger.info(f"Model loaded successfully on '{device}'.")
+
+    # --- 4. Process Images and Upsert to Qdrant ---
+    # scandir yields full paths alongside names, so nothing is joined per image later
+    with os.scandir(Config.IMAGE_DIR) as it:
+        image_entries = [(e.path, e.name) for e in it if e.name.lower().endswith(('.jpg', '.jpeg', '.png', '.webp'))]
+    if not image_entries:
+        logger.error(" No images found in the directory. Exiting.")
+        return 0
 
-def main():
+    logger.info(f" Found {len(image_entries)} images. Starting processing...")
+    logger.info(f" Using batch size {batch_size}.")
+    point_id_counter = 0 # <-- Using an integer counter
+
+    # Workers decode and preprocess upcoming batches while the GPU runs the current one
+    loader = DataLoader(
+        ImageDataset(image_entries, processor),
+        batch_size=batch_size,
+        num_workers=Config.NUM_WORKERS,
+        pin_memory=device == "cuda",
+        prefetch_factor=4 if Config.NUM_WORKERS > 0 else None,
+        collate_fn=collate_valid
+    )
+
+    memory_format = torch.channels_last if device == "cuda" else torch.contiguous_format
+
+    # Upserts run on background threads so the network round-trip overlaps the next batch's inference
+    upsert_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="upsert")
+    pending_upserts = deque()
+
+    try:
+        for batch in tqdm(loader, desc="Processing images"):
+            if batch is None: continue
+            pixel_values, valid_files = batch
+
+            # fp16 autocast on GPU halves activation bandwidth; a no-op on CPU
+            with torch.inference_mode(), torch.autocast("cuda", dtype=torch.float16, enabled=device == "cuda"):
+                pixel_values = pixel_values.to(device, memory_format=memory_format, non_blocking=True)
+                image_features = model.get_image_features(pixel_values=pixel_values)
+                # Single fused normalize in fp32 (eps-clamped), then half the bytes copied back to host
+                embeddings = F.normalize(image_features.float(), dim=-1).half().cpu().numpy()
+
+            if len(pending_upserts) >= Config.MAX_PENDING_UPSERTS:
+                pending_upserts.popleft().result()  # Bound memory and surface upsert errors early
+            # One batched upload per embedding batch, pipelined behind inference (the client still tolist()s the rows)
+            pending_upserts.append(upsert_executor.submit(
+                client.upload_collection,
+                collection_name=collection_name,
+                vectors=embeddings,
+                payload=[{"filename": filename} for filename in valid_files],
+                ids=list(range(point_id_counter, point_id_counter + len(valid_files))),
+                batch_size=len(valid_files),
+                wait=True
+            ))
+            point_id_counter += len(valid_files)
+
+        # Drain the remaining upserts before indexing and counting
+        while pending_upserts:
+            pending_upserts.popleft().result()
+    finally:
+        # On failure, drop queued uploads instead of writing into a collection about to be deleted
+        upsert_executor.shutdown(cancel_futures=True)
+
+    client.update_collection(
+        collection_name=collection_name,
+        optimizer_config=models.OptimizersConfigDiff(indexing_threshold=Config.INDEXING_THRESHOLD)
+    )
+
+    return point_id_counter
+
+def positive_int(value: str) -> int:
+    """argparse type for flags that must be a positive integer"""
+    number = int(value)
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f"must be a positive integer, got {value}")
+    return number
+
+def main(batch_size: int = None):
     """Main function to generate and upsert embeddings."""
     logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
     logger = logging.getLogger(__name__)
@@ -29,68 +227,30 @@ def main():
         client = QdrantClient(host=Config.QDRANT_HOST, port=Config.QDRANT_PORT, timeout=60)
 
         # --- 2. Set up Qdrant Collection ---
-        logger.info(f"Setting up collection '{Config.COLLECTION_NAME}'...")
-        client.recreate_collection(
-            collection_name=Config.COLLECTION_NAME,
-            vectors_config=models.VectorParams(size=Config.EMBEDDING_SIZE, distance=models.Distance.COSINE)
+        # Build into a fresh collection; COLLECTION_NAME is an alias swapped to it at the end,
+        # so the API keeps serving the previous index for the whole run
+        collection_name = f"{Config.COLLECTION_NAME}_{int(time.time())}"
+        logger.info(f"Setting up collection '{collection_name}'...")
+        client.create_collection(
+            collection_name=collection_name,
+            **image_collection_config(Config.EMBEDDING_SIZE),
+            # No HNSW building during the bulk load; it is enabled once after the last batch
+            optimizers_config=models.OptimizersConfigDiff(indexing_threshold=0)
         )
         logger.info(" Collection is ready.")
 
-        # --- 3. Load CLIP Model ---
-        logger.info(f"Loading CLIP model '{Config.EMBEDDING_MODEL}'...")
-        device = "cuda" if torch.cuda.is_available() else "cpu"
-        model = CLIPModel.from_pretrained(Config.EMBEDDING_MODEL)
-        processor = CLIPProcessor.from_pretrained(Config.EMBEDDING_MODEL)
-        model.to(device)
-        model.eval()
-        logger.info(f"Model loaded successfully on '{device}'.")
-
-        # --- 4. Process Images and Upsert to Qdrant ---
-        image_files = [f for f in os.listdir(Config.IMAGE_DIR) if f.lower().endswith(('.jpg', '.jpeg', '.png', '.webp'))]
-        if not image_files:
-            logger.error(" No images found in the directory. Exiting.")
+        try:
+            point_id_counter = embed_images(client, collection_name, batch_size, logger)
+        except BaseException:
+            # Don't leak a half-filled collection (and its on-disk vectors) on every failed run
+            logger.warning(f"Removing incomplete collection '{collection_name}'")
+            client.delete_collection(collection_name)
+            raise
+        if not point_id_counter:
+            client.delete_collection(collection_name)
             return
 
-        logger.info(f" Found {len(image_files)} images. Starting processing...")
-        batch_size = 16
-        point_id_counter = 0 # <-- Using an integer counter
-
-        for i in tqdm(range(0, len(image_files), batch_size), desc="Processing images"):
-            batch_files = image_files[i:i + batch_size]
-            batch_paths = [os.path.join(Config.IMAGE_DIR, f) for f in batch_files]
-            batch_images, valid_files = [], []
-            
-            for file_path in batch_paths:
-                try:
-                    img = Image.open(file_path).convert("RGB")
-                    batch_images.append(img)
-                    valid_files.append(os.path.basename(file_path))
-                except Exception as e:
-                    logger.warning(f"⚠️ Skipping invalid image {os.path.basename(file_path)}: {e}")
-                    continue
-            
-            if not batch_images: continue
-
-            with torch.no_grad():
-                inputs = processor(images=batch_images, return_tensors="pt", padding=True).to(device)
-                image_features = model.get_image_features(**inputs)
-                image_features /= image_features.norm(dim=-1, keepdim=True)
-                embeddings = image_features.cpu().numpy()
-
-            points_to_upsert = [
-                models.PointStruct(
-                    id=point_id_counter + j, # <-- Assigning a unique integer ID
-                    vector=embedding.tolist(),
-                    payload={"filename": filename}
-                ) for j, (filename, embedding) in enumerate(zip(valid_files, embeddings))
-            ]
-
-            client.upsert(
-                collection_name=Config.COLLECTION_NAME,
-                points=points_to_upsert,
-                wait=True
-            )
-            point_id_counter += len(points_to_upsert)
+        swap_alias(client, collection_name, logger)
 
         logger.info(f"\n Successfully processed and stored {point_id_counter} images.")
 
@@ -105,4 +265,7 @@ def main():
         logger.error(f"An error occurred during the process: {e}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Generate CLIP embeddings and upsert them to Qdrant")
+    parser.add_argument("--batch-size", type=positive_int, default=None,
+                        help="Images per forward pass (default: sized to free GPU memory, 16 on CPU)")
+    main(batch_size=parser.parse_args().batch_size)
\ No newline at end of file
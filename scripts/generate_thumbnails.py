@@ -0,0 +1,56 @@
+"""
+Thumbnail Generator for Explanation Requests
+--------------------------------
+This script pre-resizes every catalog image to a <=512px JPEG so the API can
+send it to the LLM without decoding or resizing anything at query time.
+
+Usage:
+    1. Download the images first (scripts/download_images.py)
+    2. Run the script from the project root: python -m scripts.generate_thumbnails
+    3. Thumbnails will be written to THUMB_DIR (default: 'cache/thumbs')
+
+Note:
+    - Existing thumbnails are skipped, so the script can be re-run after adding images
+    - Images without a thumbnail are still resized on the fly by the API
+"""
+
+import os
+from multiprocessing import Pool
+from PIL import Image
+from tqdm import tqdm
+
+from api.core.config import settings
+from api.utils.image_utils import get_image_files, get_thumb_path
+
+THUMB_SIZE = (512, 512)
+
+def thumb_one(image_path: str) -> bool:
+    """Write the thumbnail for a single image, returning False if it could not be read"""
+    thumb_path = get_thumb_path(os.path.basename(image_path))
+    if os.path.exists(thumb_path):
+        return True
+    
+    try:
+        with Image.open(image_path) as img:
+            img.draft("RGB", THUMB_SIZE)
+            img = img.convert("RGB")
+            img.thumbnail(THUMB_SIZE, Image.BILINEAR)
+            img.save(thumb_path, "JPEG", quality=85)
+        return True
+    except Exception as e:
+        print(f"Error creating thumbnail for {os.path.basename(image_path)}: {e}")
+        return False
+
+def generate_thumbnails():
+    """Generate thumbnails for all images in the configured image directory"""
+    os.makedirs(settings.THUMB_DIR, exist_ok=True)
+    image_files = get_image_files()
+    
+    print(f"Generating {len(image_files)} thumbnails in {settings.THUMB_DIR}...")
+    with Pool() as pool:
+        results = list(tqdm(pool.imap_unordered(thumb_one, image_files, chunksize=32), total=len(image_files)))
+    
+    print(f"Done: {sum(results)} thumbnails available, {len(results) - sum(results)} failed.")
+
+if __name__ == "__main__":
+    generate_thumbnails()